@@ -1,12 +1,27 @@
+import html
+import math
 import streamlit as st
 import numpy as np
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # Set backend before importing pyplot
-import matplotlib.pyplot as plt
-from scipy.stats import norm
-import yfinance as yf
-import datetime as dt
+from scipy.special import ndtr, ndtri
+
+# Optional: Numba-compiled kernels, kept in their own module so they are
+# compiled once per process instead of on every Streamlit rerun
+import kernels
+from kernels import numba
+
+# Optional: fused, multithreaded evaluation of the scenario returns
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
+# Optional: GPU sampling via CuPy (needs a visible CUDA device)
+try:
+    import cupy as cp
+    cp.cuda.runtime.getDeviceCount()
+except Exception:
+    cp = None
 
 # Page configuration
 st.set_page_config(
@@ -55,19 +70,150 @@ st.markdown("""
     </div>
     """, unsafe_allow_html=True)
 
-# Black-Scholes Functions
-def norm_cdf(x):
-    return norm.cdf(x)
+# Result card templates: the static styling is built once, and each row of
+# cards is emitted with a single st.markdown call. Dollar values are written
+# as &#36; so several of them in one call are not parsed as LaTeX.
+CARD_TMPL = (
+    "<div style='background: linear-gradient(135deg, {start} 0%, {end} 100%); "
+    "padding: 20px; border-radius: 8px; text-align: center;'>"
+    "<p style='color: {accent}; margin: 0; font-size: 14px;'>{label}</p>"
+    "<h2 style='color: white; margin: 10px 0;'>{value}</h2>"
+    "{note}"
+    "</div>"
+)
+NOTE_TMPL = "<p style='color: {accent}; margin: 0; font-size: 12px;'>{text}</p>"
+CARD_ROW_TMPL = (
+    "<div style='display: grid; grid-template-columns: repeat({n}, 1fr); gap: 1rem;'>"
+    "{cards}"
+    "</div>"
+)
 
+# Black-Scholes Functions
+@st.cache_data(max_entries=128)
 def calculate_black_scholes(S, K, T, r, vol):
-    d1 = (np.log(S / K) + (r + 0.5 * vol ** 2) * T) / (vol * np.sqrt(T))
-    d2 = d1 - vol * np.sqrt(T)
+    if numba is not None:
+        return kernels.black_scholes(float(S), float(K), float(T), float(r), float(vol))
+    
+    # Scalar inputs: math avoids the ufunc dispatch overhead of np.sqrt/np.exp
+    sqrtT = math.sqrt(T)
+    discount = math.exp(-r * T)
+    vol_sqrtT = vol * sqrtT
+    
+    if vol_sqrtT == 0:
+        # At expiry or with zero volatility the payoff is deterministic
+        forward_gap = math.log(S / K) + r * T
+        d1 = d2 = math.copysign(math.inf, forward_gap) if forward_gap else 0.0
+        call_price = max(S - K * discount, 0.0)
+        put_price = max(K * discount - S, 0.0)
+        return d1, d2, call_price, put_price
     
-    call_price = S * norm_cdf(d1) - K * np.exp(-r * T) * norm_cdf(d2)
-    put_price = K * np.exp(-r * T) * norm_cdf(-d2) - S * norm_cdf(-d1)
+    d1 = (math.log(S / K) + (r + 0.5 * vol * vol) * T) / vol_sqrtT
+    d2 = d1 - vol_sqrtT
+    
+    call_price = S * ndtr(d1) - K * discount * ndtr(d2)
+    put_price = K * discount * ndtr(-d2) - S * ndtr(-d1)
     
     return d1, d2, call_price, put_price
 
+# Monte Carlo Functions
+portfolio_return = 0.0003  # Daily expected return
+portfolio_std_dev = 0.008  # Daily volatility
+mc_chunk_size = 1_000_000  # Above this, simulate in constant-memory chunks
+
+def histogram_edges(portfolio_value, days, bins=50):
+    # Fixed edges at ±4σ around the model mean: no min/max pass over the
+    # samples, and the axis stays stable across reruns
+    center = portfolio_value * portfolio_return * days
+    span = 4 * portfolio_value * portfolio_std_dev * math.sqrt(days)
+    return np.linspace(center - span, center + span, bins + 1)
+
+def shock_chunks(mc_rng, simulations, antithetic, chunk_size):
+    # Every CPU path draws its shocks here, so one seed gives the same set of
+    # scenarios whichever backend runs. With antithetic pairing each chunk of
+    # draws is followed by its negation, and the odd draw (if any) comes last.
+    base = simulations // 2 if antithetic else simulations
+    step = max(1, chunk_size // 2) if antithetic else chunk_size
+    for start in range(0, base, step):
+        z = mc_rng.standard_normal(min(step, base - start), dtype=np.float32)
+        yield np.concatenate([z, -z]) if antithetic else z
+    if antithetic and simulations % 2:
+        yield mc_rng.standard_normal(1, dtype=np.float32)
+
+@st.cache_data(max_entries=32)
+def run_mc(portfolio_value, days, simulations, seed, antithetic=False):
+    # float32 halves the memory traffic of the partition and histogram passes
+    mc_rng = np.random.Generator(np.random.PCG64(seed))
+    z = np.concatenate(list(shock_chunks(mc_rng, simulations, antithetic, mc_chunk_size)))
+    drift = np.float32(portfolio_value * portfolio_return * days)
+    scale = np.float32(portfolio_value * portfolio_std_dev * math.sqrt(days))
+    if numba is not None:
+        returns = kernels.mc_returns(z, drift, scale)
+    elif ne is not None:
+        returns = ne.evaluate("drift + scale * z",
+                              local_dict={"drift": drift, "scale": scale, "z": z})
+    else:
+        returns = drift + scale * z
+    return returns
+
+@st.cache_data(max_entries=32)
+def run_mc_streaming(portfolio_value, days, simulations, seed, antithetic, confidence,
+                     chunk_size=mc_chunk_size):
+    # Memory is O(chunk_size + k) instead of O(simulations): moments are merged
+    # chunk by chunk, histogram counts accumulate on fixed edges, and only the
+    # k smallest returns seen so far are kept for the VaR order statistic
+    mc_rng = np.random.Generator(np.random.PCG64(seed))
+    drift = np.float32(portfolio_value * portfolio_return * days)
+    scale = np.float32(portfolio_value * portfolio_std_dev * math.sqrt(days))
+    edges = histogram_edges(portfolio_value, days)
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    k = int((1 - confidence) * simulations) + 1
+    smallest = np.empty(0, dtype=np.float32)
+    n, mean, m2 = 0, 0.0, 0.0
+    
+    for z in shock_chunks(mc_rng, simulations, antithetic, chunk_size):
+        size = len(z)
+        chunk = drift + scale * z
+        
+        # Merge the chunk's mean and sum of squared deviations into the totals
+        chunk_mean = chunk.mean(dtype=np.float64)
+        chunk_m2 = chunk.var(dtype=np.float64) * size
+        delta = chunk_mean - mean
+        total = n + size
+        mean += delta * size / total
+        m2 += chunk_m2 + delta * delta * n * size / total
+        n = total
+        
+        counts += np.histogram(chunk, bins=edges)[0]
+        
+        smallest = np.concatenate([smallest, chunk])
+        if len(smallest) > k:
+            smallest = np.partition(smallest, k - 1)[:k]
+    
+    var_value = -float(smallest.max())
+    return mean, math.sqrt(m2 / n), var_value, counts
+
+@st.cache_data(max_entries=32)
+def run_mc_gpu(portfolio_value, days, simulations, seed, antithetic, confidence, sample_size=10000):
+    # Samples stay on the device; only the moments, the VaR and a strided
+    # subsample for the histogram are copied back to the host
+    gpu_rng = cp.random.default_rng(seed)
+    if antithetic:
+        z_half = gpu_rng.standard_normal(simulations // 2, dtype=cp.float32)
+        z = cp.concatenate([z_half, -z_half,
+                            gpu_rng.standard_normal(simulations % 2, dtype=cp.float32)])
+    else:
+        z = gpu_rng.standard_normal(simulations, dtype=cp.float32)
+    drift = np.float32(portfolio_value * portfolio_return * days)
+    scale = np.float32(portfolio_value * portfolio_std_dev * math.sqrt(days))
+    returns = drift + scale * z
+    
+    mean_return = float(returns.mean(dtype=cp.float64))
+    std_dev = float(returns.std(dtype=cp.float64))
+    var_index = int((1 - confidence) * simulations)
+    var_value = -float(cp.partition(returns, var_index)[var_index])
+    sample = cp.asnumpy(returns[::max(1, simulations // sample_size)])
+    return mean_return, std_dev, var_value, sample
+
 # Create tabs
 tab1, tab2 = st.tabs(["📊 Black-Scholes Pricing", "⚠️ Value at Risk (VaR)"])
 
@@ -78,58 +224,32 @@ with tab1:
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
-        S = st.number_input("Stock Price (S)", value=45.0, step=1.0)
+        S = st.number_input("Stock Price (S)", value=45.0, min_value=0.01, step=1.0)
     with col2:
-        K = st.number_input("Strike Price (K)", value=40.0, step=1.0)
+        K = st.number_input("Strike Price (K)", value=40.0, min_value=0.01, step=1.0)
     with col3:
-        T = st.number_input("Time to Expiration (years)", value=0.5, step=0.1)
+        T = st.number_input("Time to Expiration (years)", value=0.5, min_value=0.0, step=0.1)
     with col4:
         r = st.number_input("Risk-free Rate (r)", value=0.1, step=0.01, format="%.3f")
     with col5:
-        vol = st.number_input("Volatility (σ)", value=0.2, step=0.01, format="%.3f")
+        vol = st.number_input("Volatility (σ)", value=0.2, min_value=0.0, step=0.01, format="%.3f")
     
     # Calculate
     d1, d2, call_price, put_price = calculate_black_scholes(S, K, T, r, vol)
     
     # Display results
     st.markdown("### Results")
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.markdown(f"""
-        <div style='background: linear-gradient(135deg, #0ea5e9 0%, #06b6d4 100%); 
-                    padding: 20px; border-radius: 8px; text-align: center;'>
-            <p style='color: #cffafe; margin: 0; font-size: 14px;'>Call Option Price</p>
-            <h2 style='color: white; margin: 10px 0;'>${call_price:.2f}</h2>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-        <div style='background: linear-gradient(135deg, #f43f5e 0%, #e11d48 100%); 
-                    padding: 20px; border-radius: 8px; text-align: center;'>
-            <p style='color: #fecdd3; margin: 0; font-size: 14px;'>Put Option Price</p>
-            <h2 style='color: white; margin: 10px 0;'>${put_price:.2f}</h2>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown(f"""
-        <div style='background: linear-gradient(135deg, #22c55e 0%, #16a34a 100%); 
-                    padding: 20px; border-radius: 8px; text-align: center;'>
-            <p style='color: #dcfce7; margin: 0; font-size: 14px;'>d1 Value</p>
-            <h2 style='color: white; margin: 10px 0;'>{d1:.4f}</h2>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col4:
-        st.markdown(f"""
-        <div style='background: linear-gradient(135deg, #eab308 0%, #ca8a04 100%); 
-                    padding: 20px; border-radius: 8px; text-align: center;'>
-            <p style='color: #fef9c3; margin: 0; font-size: 14px;'>d2 Value</p>
-            <h2 style='color: white; margin: 10px 0;'>{d2:.4f}</h2>
-        </div>
-        """, unsafe_allow_html=True)
+    cards = "".join([
+        CARD_TMPL.format(start="#0ea5e9", end="#06b6d4", accent="#cffafe",
+                         label="Call Option Price", value=f"&#36;{call_price:.2f}", note=""),
+        CARD_TMPL.format(start="#f43f5e", end="#e11d48", accent="#fecdd3",
+                         label="Put Option Price", value=f"&#36;{put_price:.2f}", note=""),
+        CARD_TMPL.format(start="#22c55e", end="#16a34a", accent="#dcfce7",
+                         label="d1 Value", value=f"{d1:.4f}", note=""),
+        CARD_TMPL.format(start="#eab308", end="#ca8a04", accent="#fef9c3",
+                         label="d2 Value", value=f"{d2:.4f}", note=""),
+    ])
+    st.markdown(CARD_ROW_TMPL.format(n=4, cards=cards), unsafe_allow_html=True)
 
 # TAB 2: VaR
 with tab2:
@@ -138,14 +258,36 @@ with tab2:
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        portfolio_value = st.number_input("Portfolio Value ($)", value=1000000, step=10000)
+        portfolio_value = st.number_input("Portfolio Value ($)", value=1000000, min_value=1, step=10000)
     with col2:
-        days = st.number_input("Time Horizon (days)", value=20, step=1)
+        days = st.number_input("Time Horizon (days)", value=20, min_value=1, step=1)
     with col3:
         confidence = st.selectbox("Confidence Level", [0.90, 0.95, 0.99], index=1, format_func=lambda x: f"{x*100:.0f}%")
     with col4:
         simulations = st.number_input("Simulations", value=10000, step=1000)
     
+    method = st.radio(
+        "Method",
+        ["Analytic", "Monte Carlo"],
+        index=1,
+        horizontal=True,
+        help="Analytic uses the closed-form normal quantile; Monte Carlo also shows the scenario distribution"
+    )
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        antithetic = st.checkbox(
+            "Antithetic variates",
+            help="Pair each random shock with its negation to reduce variance at the same number of simulations"
+        )
+    with col2:
+        seed = st.number_input(
+            "RNG seed", value=0, min_value=0, max_value=2**32 - 1, step=1, key="seed",
+            help="Same seed and inputs reproduce the same scenarios across reruns. All CPU paths "
+                 "draw from one NumPy PCG64 stream; on a CUDA GPU, CuPy draws its own stream, so "
+                 "the same seed gives different scenarios there."
+        )
+    
     # Custom tickers section
     st.markdown("### 📊 Portfolio Composition")
     use_custom_tickers = st.checkbox("Use Custom Stock Tickers")
@@ -163,91 +305,83 @@ with tab2:
     
     # Calculate button
     if st.button("🔄 Calculate VaR", type="primary"):
-        with st.spinner("Running Monte Carlo simulation..."):
-            # Monte Carlo simulation
-            portfolio_return = 0.0003  # Daily expected return
-            portfolio_std_dev = 0.008  # Daily volatility
-            
-            returns = []
-            for _ in range(simulations):
-                # Box-Muller transform
-                u1 = np.random.random()
-                u2 = np.random.random()
-                z = np.sqrt(-2 * np.log(u1)) * np.cos(2 * np.pi * u2)
-                
-                scenario_return = (portfolio_value * portfolio_return * days + 
-                                 portfolio_value * portfolio_std_dev * z * np.sqrt(days))
-                returns.append(scenario_return)
-            
-            returns = np.array(returns)
-            returns.sort()
-            
-            var_index = int((1 - confidence) * simulations)
-            var_value = -returns[var_index]
-            mean_return = returns.mean()
-            std_dev = returns.std()
-            
-            # Display metrics
-            st.markdown("### 📈 Risk Metrics")
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.markdown(f"""
-                <div style='background: linear-gradient(135deg, #dc2626 0%, #b91c1c 100%); 
-                            padding: 20px; border-radius: 8px; text-align: center;'>
-                    <p style='color: #fecdd3; margin: 0; font-size: 14px;'>Value at Risk (VaR)</p>
-                    <h2 style='color: white; margin: 10px 0;'>${var_value:,.2f}</h2>
-                    <p style='color: #fecdd3; margin: 0; font-size: 12px;'>at {confidence*100:.0f}% confidence</p>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col2:
-                st.markdown(f"""
-                <div style='background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%); 
-                            padding: 20px; border-radius: 8px; text-align: center;'>
-                    <p style='color: #dbeafe; margin: 0; font-size: 14px;'>Expected Return</p>
-                    <h2 style='color: white; margin: 10px 0;'>${mean_return:,.2f}</h2>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with col3:
-                st.markdown(f"""
-                <div style='background: linear-gradient(135deg, #6366f1 0%, #4f46e5 100%); 
-                            padding: 20px; border-radius: 8px; text-align: center;'>
-                    <p style='color: #e0e7ff; margin: 0; font-size: 14px;'>Standard Deviation</p>
-                    <h2 style='color: white; margin: 10px 0;'>${std_dev:,.2f}</h2>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            # Display tickers
-            if ticker_list:
-                st.markdown("### 📋 Portfolio Holdings")
-                ticker_cols = st.columns(len(ticker_list))
-                for idx, ticker in enumerate(ticker_list):
-                    with ticker_cols[idx]:
-                        st.markdown(f"""
-                        <div style='background: #667eea; color: white; padding: 8px; 
-                                    border-radius: 6px; text-align: center; font-weight: 600;'>
-                            {ticker}
-                        </div>
-                        """, unsafe_allow_html=True)
-            
-            # Plot histogram
+        returns = None
+        counts = None
+        if method == "Analytic":
+            # Closed form for the normal model: no sampling required
+            mean_return = portfolio_value * portfolio_return * days
+            std_dev = portfolio_value * portfolio_std_dev * math.sqrt(days)
+            var_value = -(mean_return + std_dev * ndtri(1 - confidence))
+        else:
+            with st.spinner("Running Monte Carlo simulation..."):
+                if cp is not None:
+                    # GPU path: returns holds only a subsample for the histogram
+                    mean_return, std_dev, var_value, returns = run_mc_gpu(
+                        portfolio_value, days, simulations, seed, antithetic, confidence
+                    )
+                elif simulations > mc_chunk_size:
+                    # Too many scenarios to hold at once: stream them in chunks
+                    mean_return, std_dev, var_value, counts = run_mc_streaming(
+                        portfolio_value, days, simulations, seed, antithetic, confidence
+                    )
+                else:
+                    # Monte Carlo simulation (cached on the seed, so changing only the
+                    # confidence level reuses the same samples)
+                    returns = run_mc(portfolio_value, days, simulations, seed, antithetic)
+                    
+                    # Accumulate the float32 samples in float64 for the displayed moments
+                    mean_return = returns.mean(dtype=np.float64)
+                    std_dev = returns.std(dtype=np.float64)
+                    
+                    # VaR only needs the k-th order statistic, not a full sort
+                    var_index = int((1 - confidence) * simulations)
+                    var_value = -np.partition(returns, var_index)[var_index]
+        
+        # Display metrics
+        st.markdown("### 📈 Risk Metrics")
+        cards = "".join([
+            CARD_TMPL.format(start="#dc2626", end="#b91c1c", accent="#fecdd3",
+                             label="Value at Risk (VaR)", value=f"&#36;{var_value:,.2f}",
+                             note=NOTE_TMPL.format(accent="#fecdd3",
+                                                   text=f"at {confidence*100:.0f}% confidence")),
+            CARD_TMPL.format(start="#3b82f6", end="#2563eb", accent="#dbeafe",
+                             label="Expected Return", value=f"&#36;{mean_return:,.2f}", note=""),
+            CARD_TMPL.format(start="#6366f1", end="#4f46e5", accent="#e0e7ff",
+                             label="Standard Deviation", value=f"&#36;{std_dev:,.2f}", note=""),
+        ])
+        st.markdown(CARD_ROW_TMPL.format(n=3, cards=cards), unsafe_allow_html=True)
+        
+        # Display tickers
+        if ticker_list:
+            st.markdown("### 📋 Portfolio Holdings")
+            # One flexbox markdown call instead of one column per ticker
+            chips = "".join(
+                f"<div style='background: #667eea; color: white; padding: 8px 16px; "
+                f"border-radius: 6px; text-align: center; font-weight: 600;'>{html.escape(ticker)}</div>"
+                for ticker in ticker_list
+            )
+            st.markdown(
+                f"<div style='display: flex; gap: 8px; flex-wrap: wrap;'>{chips}</div>",
+                unsafe_allow_html=True
+            )
+        
+        # Plot histogram
+        if returns is not None or counts is not None:
             st.markdown("### 📊 Distribution of Scenario Returns")
-            fig, ax = plt.subplots(figsize=(12, 6))
-            fig.patch.set_facecolor('#0f172a')
-            ax.set_facecolor('#1e293b')
-            
-            ax.hist(returns, bins=50, color='#667eea', alpha=0.7, edgecolor='white')
-            ax.axvline(-var_value, color='#dc2626', linestyle='--', linewidth=2, 
-                      label=f'VaR at {confidence*100:.0f}% confidence')
-            ax.set_xlabel('Scenario Gain/Loss ($)', color='#cbd5e1', fontsize=12)
-            ax.set_ylabel('Frequency', color='#cbd5e1', fontsize=12)
-            ax.tick_params(colors='#cbd5e1')
-            ax.legend(facecolor='#1e293b', edgecolor='#475569', labelcolor='#cbd5e1')
-            ax.grid(True, alpha=0.2, color='#475569')
-            
-            for spine in ax.spines.values():
-                spine.set_color('#475569')
+            edges = histogram_edges(portfolio_value, days)
+            if counts is None:
+                counts, _ = np.histogram(returns, bins=edges)
             
-            st.pyplot(fig)
+            # Rendered client-side from a small table instead of a rasterized figure.
+            # Bin centers are rounded one digit finer than the bin width so that
+            # distinct bins never collapse onto the same label.
+            width = edges[1] - edges[0]
+            decimals = max(0, 1 - math.floor(math.log10(width)))
+            hist_df = pd.DataFrame(
+                {"Frequency": counts},
+                index=pd.Index(np.round(0.5 * (edges[:-1] + edges[1:]), decimals),
+                               name="Scenario Gain/Loss ($)")
+            )
+            st.bar_chart(hist_df, color="#667eea")
+            st.caption(f"VaR at {confidence*100:.0f}% confidence: loss of \\${var_value:,.2f} "
+                       f"(scenario gain/loss of \\${-var_value:,.2f})")
@@ -0,0 +1,51 @@
+# Optional Numba kernels for app.py.
+#
+# Streamlit re-executes app.py on every rerun, but imported modules stay in
+# sys.modules, so the eagerly compiled kernels below are built (or loaded from
+# numba's on-disk cache) once per server process rather than on every rerun.
+import math
+import numpy as np
+
+try:
+    import numba
+    from numba import njit
+except ImportError:
+    numba = None
+
+if numba is not None:
+    # Φ is expressed through math.erf. No fastmath: the expiry branch returns
+    # infinite d1/d2, which fastmath is allowed to assume never happens.
+    @njit("UniTuple(float64, 4)(float64, float64, float64, float64, float64)",
+          cache=True)
+    def black_scholes(S, K, T, r, vol):
+        sqrtT = math.sqrt(T)
+        discount = math.exp(-r * T)
+        vol_sqrtT = vol * sqrtT
+        
+        if vol_sqrtT == 0.0:
+            # At expiry or with zero volatility the payoff is deterministic
+            forward_gap = math.log(S / K) + r * T
+            d = math.copysign(np.inf, forward_gap) if forward_gap != 0.0 else 0.0
+            return d, d, max(S - K * discount, 0.0), max(K * discount - S, 0.0)
+        
+        d1 = (math.log(S / K) + (r + 0.5 * vol * vol) * T) / vol_sqrtT
+        d2 = d1 - vol_sqrtT
+        
+        inv_sqrt2 = 1.0 / math.sqrt(2.0)
+        nd1 = 0.5 * (1.0 + math.erf(d1 * inv_sqrt2))
+        nd2 = 0.5 * (1.0 + math.erf(d2 * inv_sqrt2))
+        
+        call_price = S * nd1 - K * discount * nd2
+        put_price = K * discount * (1.0 - nd2) - S * (1.0 - nd1)
+        
+        return d1, d2, call_price, put_price
+
+    # Only the affine transform runs here: the shocks are drawn on the host
+    # from a seeded NumPy Generator, so the result does not depend on how
+    # prange splits the work across threads.
+    @njit("float32[:](float32[:], float32, float32)", cache=True, parallel=True)
+    def mc_returns(z, drift, scale):
+        out = np.empty(z.size, dtype=np.float32)
+        for i in numba.prange(z.size):
+            out[i] = drift + scale * z[i]
+        return out